@@ -1,2 +1,7 @@
 MAX_RESPONSE_LEN_CHAR: int = 16000
 SNIPPET_CONTEXT_WINDOW: int = 4
+MAX_READ_CACHE_ENTRIES: int = 64
+MAX_READ_CACHE_BYTES: int = 16 * 1024 * 1024
+# Files whose mtime/ctime is this recent are not cached (like git's racy-timestamp check)
+READ_CACHE_RACY_WINDOW_NS: int = 2_000_000_000
+MAX_FILE_HISTORY_LENGTH: int = 16
@@ -1,12 +1,20 @@
+import os
+import re
 import tempfile
-from collections import defaultdict
+import time
+from collections import OrderedDict, defaultdict, deque
 from pathlib import Path
 from typing import Literal, get_args
 
 from openhands_aci.linter import DefaultLinter
-from openhands_aci.utils.shell import run_shell_cmd
 
-from .config import SNIPPET_CONTEXT_WINDOW
+from .config import (
+    MAX_FILE_HISTORY_LENGTH,
+    MAX_READ_CACHE_BYTES,
+    MAX_READ_CACHE_ENTRIES,
+    READ_CACHE_RACY_WINDOW_NS,
+    SNIPPET_CONTEXT_WINDOW,
+)
 from .exceptions import (
     EditorToolParameterInvalidError,
     EditorToolParameterMissingError,
@@ -40,7 +48,16 @@ class OHEditor:
     TOOL_NAME = 'oh_editor'
 
     def __init__(self):
-        self._file_history: dict[Path, list[str]] = defaultdict(list)
+        # Only the most recent MAX_FILE_HISTORY_LENGTH versions of each file can be undone
+        self._file_history: dict[Path, deque[str]] = defaultdict(
+            lambda: deque(maxlen=MAX_FILE_HISTORY_LENGTH)
+        )
+        # LRU cache of (signature, size on disk, content) per path, validated by
+        # _file_signature and bounded by MAX_READ_CACHE_ENTRIES and MAX_READ_CACHE_BYTES
+        self._read_cache: OrderedDict[Path, tuple[tuple[int, ...], int, str]] = (
+            OrderedDict()
+        )
+        self._read_cache_bytes = 0
         self._linter = DefaultLinter()
 
     def __call__(
@@ -95,29 +112,44 @@ class OHEditor:
         """
         Implement the str_replace command, which replaces old_str with new_str in the file content.
         """
-        file_content = self.read_file(path).expandtabs()
-        old_str = old_str.expandtabs()
-        new_str = new_str.expandtabs() if new_str is not None else ''
-
-        # Check if old_str is unique in the file
-        occurrences = file_content.count(old_str)
-        if occurrences == 0:
+        if not old_str:
+            # An empty old_str would match at every offset
+            raise EditorToolParameterMissingError('str_replace', 'old_str')
+        file_content = _expand_tabs(self.read_file(path))
+        old_str = _expand_tabs(old_str)
+        new_str = _expand_tabs(new_str) if new_str is not None else ''
+
+        # Check if old_str is unique in the file; only a second match is needed for that
+        pos = file_content.find(old_str)
+        if pos == -1:
             raise ToolError(
                 f'No replacement was performed, old_str `{old_str}` did not appear verbatim in {path}.'
             )
-        if occurrences > 1:
-            file_content_lines = file_content.split('\n')
-            line_numbers = [
-                idx + 1
-                for idx, line in enumerate(file_content_lines)
-                if old_str in line
-            ]
+        if file_content.find(old_str, pos + len(old_str)) != -1:
+            if '\n' not in old_str:
+                line_numbers = [
+                    idx + 1
+                    for idx, line in enumerate(file_content.split('\n'))
+                    if old_str in line
+                ]
+            else:
+                # Each match spans a newline, so matches start on distinct lines and
+                # newlines can be counted incrementally between the ascending offsets
+                line_numbers = []
+                line_number, prev_offset, offset = 1, 0, pos
+                while offset != -1:
+                    line_number += file_content.count('\n', prev_offset, offset)
+                    line_numbers.append(line_number)
+                    prev_offset = offset
+                    offset = file_content.find(old_str, offset + len(old_str))
             raise ToolError(
                 f'No replacement was performed. Multiple occurrences of old_str `{old_str}` in lines {line_numbers}. Please ensure it is unique.'
             )
 
         # Replace old_str with new_str
-        new_file_content = file_content.replace(old_str, new_str)
+        new_file_content = (
+            file_content[:pos] + new_str + file_content[pos + len(old_str) :]
+        )
 
         # Write the new content to the file
         self.write_file(path, new_file_content)
@@ -126,10 +158,20 @@ class OHEditor:
         self._file_history[path].append(file_content)
 
         # Create a snippet of the edited section
-        replacement_line = file_content.split(old_str)[0].count('\n')
+        replacement_line = file_content.count('\n', 0, pos)
         start_line = max(0, replacement_line - SNIPPET_CONTEXT_WINDOW)
         end_line = replacement_line + SNIPPET_CONTEXT_WINDOW + new_str.count('\n')
-        snippet = '\n'.join(new_file_content.split('\n')[start_line : end_line + 1])
+        snippet_start = _find_line_start(
+            new_file_content, pos, replacement_line - start_line
+        )
+        snippet_end = _skip_lines(
+            new_file_content, end_line - start_line + 1, snippet_start
+        )
+        snippet = new_file_content[
+            snippet_start : len(new_file_content)
+            if snippet_end == -1
+            else snippet_end - 1
+        ]
 
         # Prepare the success message
         success_message = f'The file {path} has been edited. '
@@ -157,9 +199,9 @@ class OHEditor:
                     'The `view_range` parameter is not allowed when `path` points to a directory.',
                 )
 
-            _, stdout, stderr = run_shell_cmd(
-                rf"find {path} -maxdepth 2 -not -path '*/\.*'"
-            )
+            paths, errors = _list_dir(str(path), max_depth=2)
+            stdout = maybe_truncate('\n'.join(paths) + '\n')
+            stderr = maybe_truncate('\n'.join(errors))
             if not stderr:
                 stdout = f"Here's the files and directories up to 2 levels deep in {path}, excluding hidden items:\n{stdout}\n"
             return CLIResult(output=stdout, error=stderr)
@@ -178,8 +220,7 @@ class OHEditor:
                 'It should be a list of two integers.',
             )
 
-        file_content_lines = file_content.split('\n')
-        num_lines = len(file_content_lines)
+        num_lines = file_content.count('\n') + 1
         start_line, end_line = view_range
         if start_line < 1 or start_line > num_lines:
             raise EditorToolParameterInvalidError(
@@ -202,16 +243,21 @@ class OHEditor:
                 f'Its second element `{end_line}` should be greater than or equal to the first element `{start_line}`.',
             )
 
-        if end_line == -1:
-            file_content = '\n'.join(file_content_lines[start_line - 1 :])
-        else:
-            file_content = '\n'.join(file_content_lines[start_line - 1 : end_line])
+        start = _skip_lines(file_content, start_line - 1)
+        end = (
+            -1
+            if end_line == -1
+            else _skip_lines(file_content, end_line - start_line + 1, start)
+        )
+        file_content = file_content[start : len(file_content) if end == -1 else end - 1]
         return CLIResult(output=self._make_output(file_content, str(path), start_line))
 
     def write_file(self, path: Path, file_text: str) -> None:
         """
         Write the content of a file to a given path; raise a ToolError if an error occurs.
         """
+        # Drop the cached content; reading back may differ from file_text (e.g. newlines)
+        self._uncache_file_text(path)
         try:
             path.write_text(file_text)
         except Exception as e:
@@ -228,11 +274,10 @@ class OHEditor:
         except Exception as e:
             raise ToolError(f'Ran into {e} while trying to read {path}') from None
 
-        file_text = file_text.expandtabs()
-        new_str = new_str.expandtabs()
+        file_text = _expand_tabs(file_text)
+        new_str = _expand_tabs(new_str)
 
-        file_text_lines = file_text.split('\n')
-        num_lines = len(file_text_lines)
+        num_lines = file_text.count('\n') + 1
 
         if insert_line < 0 or insert_line > num_lines:
             raise EditorToolParameterInvalidError(
@@ -241,21 +286,38 @@ class OHEditor:
                 f'It should be within the range of lines of the file: {[0, num_lines]}',
             )
 
-        new_str_lines = new_str.split('\n')
-        new_file_text_lines = (
-            file_text_lines[:insert_line]
-            + new_str_lines
-            + file_text_lines[insert_line:]
-        )
-        snippet_lines = (
-            file_text_lines[max(0, insert_line - SNIPPET_CONTEXT_WINDOW) : insert_line]
-            + new_str_lines
-            + file_text_lines[
-                insert_line : min(num_lines, insert_line + SNIPPET_CONTEXT_WINDOW)
-            ]
+        # Lines before and after the insertion point, joined around new_str
+        file_text_parts = [new_str]
+        snippet_parts = [new_str]
+        # Offset where the line currently at insert_line starts
+        split_at = (
+            _skip_lines(file_text, insert_line)
+            if insert_line < num_lines
+            else len(file_text) + 1
         )
-        new_file_text = '\n'.join(new_file_text_lines)
-        snippet = '\n'.join(snippet_lines)
+        if insert_line > 0:
+            before_end = split_at - 1
+            file_text_parts.insert(0, file_text[:before_end])
+            before_start = _find_line_start(
+                file_text,
+                before_end,
+                insert_line - 1 - max(0, insert_line - SNIPPET_CONTEXT_WINDOW),
+            )
+            snippet_parts.insert(0, file_text[before_start:before_end])
+        if insert_line < num_lines:
+            file_text_parts.append(file_text[split_at:])
+            after_end = _skip_lines(
+                file_text,
+                min(num_lines, insert_line + SNIPPET_CONTEXT_WINDOW) - insert_line,
+                split_at,
+            )
+            snippet_parts.append(
+                file_text[
+                    split_at : len(file_text) if after_end == -1 else after_end - 1
+                ]
+            )
+        new_file_text = '\n'.join(file_text_parts)
+        snippet = '\n'.join(snippet_parts)
 
         self.write_file(path, new_file_text)
         self._file_history[path].append(file_text)
@@ -326,10 +388,41 @@ class OHEditor:
         Read the content of a file from a given path; raise a ToolError if an error occurs.
         """
         try:
-            return path.read_text()
+            stat = path.stat()
+            signature = _file_signature(stat)
+            cached = self._read_cache.get(path)
+            if cached is not None and cached[0] == signature:
+                self._read_cache.move_to_end(path)
+                return cached[2]
+            file_text = path.read_text()
         except Exception as e:
             raise ToolError(f'Ran into {e} while trying to read {path}') from None
 
+        self._uncache_file_text(path)
+        # A file changed within the last timestamp tick can change again without its
+        # signature moving, so only cache it once its timestamps are safely in the past
+        racy = (
+            time.time_ns() - max(stat.st_mtime_ns, stat.st_ctime_ns)
+            < READ_CACHE_RACY_WINDOW_NS
+        )
+        if not racy and stat.st_size <= MAX_READ_CACHE_BYTES:
+            self._read_cache[path] = (signature, stat.st_size, file_text)
+            self._read_cache_bytes += stat.st_size
+            while (
+                len(self._read_cache) > MAX_READ_CACHE_ENTRIES
+                or self._read_cache_bytes > MAX_READ_CACHE_BYTES
+            ):
+                self._uncache_file_text(next(iter(self._read_cache)))
+        return file_text
+
+    def _uncache_file_text(self, path: Path) -> None:
+        """
+        Drop the cached content of a file, if any.
+        """
+        cached = self._read_cache.pop(path, None)
+        if cached is not None:
+            self._read_cache_bytes -= cached[1]
+
     def _make_output(
         self,
         snippet_content: str,
@@ -342,12 +435,15 @@ class OHEditor:
         """
         snippet_content = maybe_truncate(snippet_content)
         if expand_tabs:
-            snippet_content = snippet_content.expandtabs()
+            snippet_content = _expand_tabs(snippet_content)
 
+        # %-formatting is cheaper than an f-string for this int/str pair
         snippet_content = '\n'.join(
             [
-                f'{i + start_line:6}\t{line}'
-                for i, line in enumerate(snippet_content.split('\n'))
+                '%6d\t%s' % (line_number, line)
+                for line_number, line in enumerate(
+                    snippet_content.split('\n'), start_line
+                )
             ]
         )
         return (
@@ -383,3 +479,73 @@ class OHEditor:
                     f'- Line {result.line}, Column {result.column}: {result.message}'
                 )
             return '\n'.join(output) + '\n'
+
+
+def _expand_tabs(text: str) -> str:
+    """
+    Expand tabs in text. Checking for a tab first is cheap, since `in` uses a fast substring
+    search while str.expandtabs scans the string one character at a time.
+    """
+    return text.expandtabs() if '\t' in text else text
+
+
+def _list_dir(root: str, max_depth: int) -> tuple[list[str], list[str]]:
+    """
+    List root and its non-hidden descendants up to max_depth levels deep, in the same
+    pre-order format as `find root -maxdepth max_depth -not -path '*/\\.*'`.
+
+    Returns:
+        A tuple of the listed paths and the errors met while scanning directories.
+    """
+    paths = [root]
+    errors: list[str] = []
+
+    def _walk(dir_path: str, depth: int) -> None:
+        try:
+            with os.scandir(dir_path) as it:
+                entries = sorted(
+                    (entry for entry in it if not entry.name.startswith('.')),
+                    key=lambda entry: entry.name,
+                )
+        except OSError as e:
+            errors.append(f'Ran into {e} while listing {dir_path}')
+            return
+        for entry in entries:
+            paths.append(os.path.join(dir_path, entry.name))
+            if depth < max_depth and entry.is_dir(follow_symlinks=False):
+                _walk(paths[-1], depth + 1)
+
+    _walk(root, 1)
+    return paths, errors
+
+
+def _file_signature(stat: os.stat_result) -> tuple[int, ...]:
+    """
+    Identify a version of a file's content. mtime and size alone can be restored by
+    `cp -p`, `rsync -t` or `tar -x`; ctime cannot be set, and moves on writes and renames,
+    but only at the filesystem's timestamp resolution (see READ_CACHE_RACY_WINDOW_NS).
+    """
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns, stat.st_ctime_ns)
+
+
+def _skip_lines(text: str, count: int, start: int = 0) -> int:
+    """
+    Return the offset just past the count-th newline at or after start, or -1 if there are
+    fewer. The newlines are matched inside the regex engine, so no per-line objects are built.
+    """
+    if count <= 0:
+        return start
+    # One pattern per distinct count: compiling takes ~30us and lands in re's bounded
+    # compile cache, while a fixed one-line pattern would need a Python-level loop per line
+    match = re.compile(r'(?:[^\n]*+\n){%d}' % count).match(text, start)
+    return match.end() if match else -1
+
+
+def _find_line_start(text: str, pos: int, count: int = 0) -> int:
+    """
+    Return the start offset of the line count lines above the one containing offset pos.
+    """
+    start = text.rfind('\n', 0, pos) + 1
+    for _ in range(count):
+        start = text.rfind('\n', 0, start - 1) + 1
+    return start
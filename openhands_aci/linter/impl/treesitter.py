@@ -2,6 +2,7 @@ import warnings
 
 from grep_ast import TreeContext, filename_to_lang
 from grep_ast.parsers import PARSERS
+from tree_sitter import Parser
 from tree_sitter_languages import get_parser
 
 from ..base import BaseLinter, LintResult
@@ -47,6 +48,10 @@ def traverse_tree(node):
 
 
 class TreesitterBasicLinter(BaseLinter):
+    def __init__(self):
+        # Parsers are built once per language and reused across files
+        self._parsers: dict[str, Parser] = {}
+
     @property
     def supported_extensions(self) -> list[str]:
         return list(PARSERS.keys())
@@ -56,7 +61,7 @@ class TreesitterBasicLinter(BaseLinter):
         lang = filename_to_lang(file_path)
         if not lang:
             return []
-        parser = get_parser(lang)
+        parser = self._get_parser(lang)
         with open(file_path, 'r') as f:
             code = f.read()
         tree = parser.parse(bytes(code, 'utf-8'))
@@ -72,3 +77,9 @@ class TreesitterBasicLinter(BaseLinter):
             )
             for line, col, error_details in errors
         ]
+
+    def _get_parser(self, lang: str) -> Parser:
+        parser = self._parsers.get(lang)
+        if parser is None:
+            parser = self._parsers[lang] = get_parser(lang)
+        return parser
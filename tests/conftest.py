@@ -0,0 +1,10 @@
+import os
+
+# tmpfs mount available on most Linux hosts; keeps test file I/O in memory
+SHM_DIR = '/dev/shm'
+
+
+def pytest_configure(config):
+    # pytest's tmp_path_factory reads this lazily when the first temp dir is created
+    if os.path.isdir(SHM_DIR) and os.access(SHM_DIR, os.W_OK):
+        os.environ.setdefault('PYTEST_DEBUG_TEMPROOT', SHM_DIR)
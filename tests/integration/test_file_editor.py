@@ -1,5 +1,10 @@
+import os
+import shutil
+import time
+
 import pytest
 
+from openhands_aci.editor.config import MAX_FILE_HISTORY_LENGTH, MAX_READ_CACHE_BYTES
 from openhands_aci.editor.editor import OHEditor
 from openhands_aci.editor.exceptions import (
     EditorToolParameterInvalidError,
@@ -8,23 +13,65 @@ from openhands_aci.editor.exceptions import (
 )
 from openhands_aci.editor.results import CLIResult, ToolResult
 
+TEST_FILE_CONTENT = b'This is a test file.\nThis file is for testing purposes.'
+TEST_PYTHON_FILE_WITH_TABS_CONTENT = b'def test():\n\tprint("Hello, World!")'
+
+# Expected outputs of editing TEST_FILE_CONTENT, built once and formatted per test
+STR_REPLACE_OUTPUT_TEMPLATE = """The file {path} has been edited. Here's the result of running `cat -n` on a snippet of {path}:
+     1\tThis is a sample file.
+     2\tThis file is for testing purposes.
+{lint_output}Review the changes and make sure they are as expected. Edit the file again if necessary."""
+INSERT_OUTPUT_TEMPLATE = """The file {path} has been edited. Here's the result of running `cat -n` on a snippet of the edited file:
+     1\tThis is a test file.
+     2\tInserted line
+     3\tThis file is for testing purposes.
+{lint_output}Review the changes and make sure they are as expected (correct indentation, no duplicate lines, etc). Edit the file again if necessary."""
+NO_LINTING_ISSUES_OUTPUT = '\nNo linting issues found in the changes.\n'
+
+
+def _file_contains(path, needle):
+    """Search the raw bytes of a file for needle, without decoding it."""
+    return path.read_bytes().find(needle) != -1
+
+
+def _restore_workspace(test_file, content):
+    """Undo a test's changes: restore the test file and remove anything created next to it."""
+    for entry in test_file.parent.iterdir():
+        if entry == test_file:
+            continue
+        if entry.is_dir() and not entry.is_symlink():
+            shutil.rmtree(entry)
+        else:
+            entry.unlink()
+    if test_file.read_bytes() != content:
+        test_file.write_bytes(content)
+
+
+@pytest.fixture(scope='module')
+def module_test_file(tmp_path_factory):
+    # Written once per module; `editor` restores it after each test
+    test_file = tmp_path_factory.mktemp('editor') / 'test.txt'
+    test_file.write_bytes(TEST_FILE_CONTENT)
+    return test_file
+
+
+@pytest.fixture(scope='module')
+def module_python_file_with_tabs(tmp_path_factory):
+    test_file = tmp_path_factory.mktemp('editor_python') / 'test.py'
+    test_file.write_bytes(TEST_PYTHON_FILE_WITH_TABS_CONTENT)
+    return test_file
+
 
 @pytest.fixture
-def editor(tmp_path):
-    editor = OHEditor()
-    # Set up a temporary directory with test files
-    test_file = tmp_path / 'test.txt'
-    test_file.write_text('This is a test file.\nThis file is for testing purposes.')
-    return editor, test_file
+def editor(module_test_file):
+    yield OHEditor(), module_test_file
+    _restore_workspace(module_test_file, TEST_FILE_CONTENT)
 
 
 @pytest.fixture
-def editor_python_file_with_tabs(tmp_path):
-    editor = OHEditor()
-    # Set up a temporary directory with test files
-    test_file = tmp_path / 'test.py'
-    test_file.write_text('def test():\n\tprint("Hello, World!")')
-    return editor, test_file
+def editor_python_file_with_tabs(module_python_file_with_tabs):
+    yield OHEditor(), module_python_file_with_tabs
+    _restore_workspace(module_python_file_with_tabs, TEST_PYTHON_FILE_WITH_TABS_CONTENT)
 
 
 def test_view_file(editor):
@@ -36,6 +83,55 @@ def test_view_file(editor):
     assert '2\tThis file is for testing purposes.' in result.output
 
 
+def test_view_file_modified_externally(editor):
+    editor, test_file = editor
+    editor(command='view', path=str(test_file))
+    test_file.write_text('This file was changed outside the editor.')
+    result = editor(command='view', path=str(test_file))
+    assert '1\tThis file was changed outside the editor.' in result.output
+    assert 'This is a test file.' not in result.output
+
+
+def test_view_file_replaced_with_same_size_and_mtime(editor):
+    editor, test_file = editor
+    test_file.write_text('beta = 11\n')
+    editor(command='view', path=str(test_file))
+    stat = test_file.stat()
+    # Same size and restored mtime, as left by `cp -p` or `rsync -t`
+    test_file.write_text('omega = 2\n')
+    os.utime(test_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert test_file.stat().st_mtime_ns == stat.st_mtime_ns
+    assert test_file.stat().st_size == stat.st_size
+
+    result = editor(command='view', path=str(test_file))
+    assert '1\tomega = 2' in result.output
+
+    editor(command='str_replace', path=str(test_file), old_str='2', new_str='3')
+    assert test_file.read_text() == 'omega = 3\n'
+
+
+def test_read_cache_skips_recently_modified_files(editor):
+    editor, test_file = editor
+    editor(command='view', path=str(test_file))
+    # Just written, so a same-tick rewrite could keep the same signature
+    assert test_file not in editor._read_cache
+
+
+def test_read_cache_bounded_by_bytes(editor, monkeypatch):
+    editor, test_file = editor
+    # Pretend the file's timestamps are old enough to be cached
+    real_time_ns = time.time_ns
+    monkeypatch.setattr(time, 'time_ns', lambda: real_time_ns() + 10**10)
+    editor(command='view', path=str(test_file))
+    assert test_file in editor._read_cache
+
+    big_file = test_file.parent / 'big.txt'
+    big_file.write_text('x' * (MAX_READ_CACHE_BYTES + 1))
+    editor(command='view', path=str(big_file))
+    assert big_file not in editor._read_cache
+    assert editor._read_cache_bytes == len(TEST_FILE_CONTENT)
+
+
 def test_view_directory(editor):
     editor, test_file = editor
     result = editor(command='view', path=str(test_file.parent))
@@ -44,13 +140,31 @@ def test_view_directory(editor):
     assert test_file.name in result.output
 
 
+def test_view_directory_depth_and_hidden_items(editor):
+    editor, test_file = editor
+    root = test_file.parent
+    (root / 'sub' / 'nested' / 'deep').mkdir(parents=True)
+    (root / 'sub' / 'nested' / 'deep' / 'too_deep.txt').write_text('')
+    (root / '.hidden').mkdir()
+    (root / '.hidden' / 'secret.txt').write_text('')
+    result = editor(command='view', path=str(root))
+    assert result.output == (
+        f"Here's the files and directories up to 2 levels deep in {root}, excluding hidden items:\n"
+        f'{root}\n'
+        f'{root / "sub"}\n'
+        f'{root / "sub" / "nested"}\n'
+        f'{test_file}\n'
+        '\n'
+    )
+
+
 def test_create_file(editor):
     editor, test_file = editor
     new_file = test_file.parent / 'new_file.txt'
     result = editor(command='create', path=str(new_file), file_text='New file content')
     assert isinstance(result, ToolResult)
     assert new_file.exists()
-    assert new_file.read_text() == 'New file content'
+    assert new_file.read_bytes() == b'New file content'
     assert 'File created successfully' in result.output
 
 
@@ -65,16 +179,12 @@ def test_str_replace_no_linting(editor):
     assert isinstance(result, CLIResult)
 
     # Test str_replace command
-    assert (
-        result.output
-        == f"""The file {test_file} has been edited. Here's the result of running `cat -n` on a snippet of {test_file}:
-     1\tThis is a sample file.
-     2\tThis file is for testing purposes.
-Review the changes and make sure they are as expected. Edit the file again if necessary."""
+    assert result.output == STR_REPLACE_OUTPUT_TEMPLATE.format(
+        path=test_file, lint_output=''
     )
 
     # Test that the file content has been updated
-    assert 'This is a sample file.' in test_file.read_text()
+    assert _file_contains(test_file, b'This is a sample file.')
 
 
 def test_str_replace_multi_line_no_linting(editor):
@@ -88,12 +198,8 @@ def test_str_replace_multi_line_no_linting(editor):
     assert isinstance(result, CLIResult)
 
     # Test str_replace command
-    assert (
-        result.output
-        == f"""The file {test_file} has been edited. Here's the result of running `cat -n` on a snippet of {test_file}:
-     1\tThis is a sample file.
-     2\tThis file is for testing purposes.
-Review the changes and make sure they are as expected. Edit the file again if necessary."""
+    assert result.output == STR_REPLACE_OUTPUT_TEMPLATE.format(
+        path=test_file, lint_output=''
     )
 
 
@@ -128,18 +234,12 @@ def test_str_replace_with_linting(editor):
     assert isinstance(result, CLIResult)
 
     # Test str_replace command
-    assert (
-        result.output
-        == f"""The file {test_file} has been edited. Here's the result of running `cat -n` on a snippet of {test_file}:
-     1\tThis is a sample file.
-     2\tThis file is for testing purposes.
-
-No linting issues found in the changes.
-Review the changes and make sure they are as expected. Edit the file again if necessary."""
+    assert result.output == STR_REPLACE_OUTPUT_TEMPLATE.format(
+        path=test_file, lint_output=NO_LINTING_ISSUES_OUTPUT
     )
 
     # Test that the file content has been updated
-    assert 'This is a sample file.' in test_file.read_text()
+    assert _file_contains(test_file, b'This is a sample file.')
 
 
 def test_str_replace_error_multiple_occurrences(editor):
@@ -151,6 +251,26 @@ def test_str_replace_error_multiple_occurrences(editor):
     assert 'Multiple occurrences of old_str `test`' in str(exc_info.value.message)
 
 
+def test_str_replace_error_multiple_multi_line_occurrences(editor):
+    editor, test_file = editor
+    test_file.write_text('foo\nbar\nbaz\nfoo\nbar\n')
+    with pytest.raises(ToolError) as exc_info:
+        editor(
+            command='str_replace',
+            path=str(test_file),
+            old_str='foo\nbar',
+            new_str='qux',
+        )
+    assert 'in lines [1, 4]' in str(exc_info.value.message)
+
+
+def test_str_replace_method_empty_old_str(editor):
+    editor, test_file = editor
+    with pytest.raises(EditorToolParameterMissingError):
+        editor.str_replace(test_file, '', 'sample', enable_linting=False)
+    assert test_file.read_bytes() == TEST_FILE_CONTENT
+
+
 def test_str_replace_nonexistent_string(editor):
     editor, test_file = editor
     with pytest.raises(ToolError) as exc_info:
@@ -172,15 +292,10 @@ def test_insert_no_linting(editor):
         command='insert', path=str(test_file), insert_line=1, new_str='Inserted line'
     )
     assert isinstance(result, CLIResult)
-    assert 'Inserted line' in test_file.read_text()
+    assert _file_contains(test_file, b'Inserted line')
     print(result.output)
-    assert (
-        result.output
-        == f"""The file {test_file} has been edited. Here's the result of running `cat -n` on a snippet of the edited file:
-     1\tThis is a test file.
-     2\tInserted line
-     3\tThis file is for testing purposes.
-Review the changes and make sure they are as expected (correct indentation, no duplicate lines, etc). Edit the file again if necessary."""
+    assert result.output == INSERT_OUTPUT_TEMPLATE.format(
+        path=test_file, lint_output=''
     )
 
 
@@ -194,17 +309,10 @@ def test_insert_with_linting(editor):
         enable_linting=True,
     )
     assert isinstance(result, CLIResult)
-    assert 'Inserted line' in test_file.read_text()
+    assert _file_contains(test_file, b'Inserted line')
     print(result.output)
-    assert (
-        result.output
-        == f"""The file {test_file} has been edited. Here's the result of running `cat -n` on a snippet of the edited file:
-     1\tThis is a test file.
-     2\tInserted line
-     3\tThis file is for testing purposes.
-
-No linting issues found in the changes.
-Review the changes and make sure they are as expected (correct indentation, no duplicate lines, etc). Edit the file again if necessary."""
+    assert result.output == INSERT_OUTPUT_TEMPLATE.format(
+        path=test_file, lint_output=NO_LINTING_ISSUES_OUTPUT
     )
 
 
@@ -236,52 +344,77 @@ def test_undo_edit(editor):
     result = editor(command='undo_edit', path=str(test_file))
     assert isinstance(result, CLIResult)
     assert 'Last edit to' in result.output
-    assert 'test file' in test_file.read_text()  # Original content restored
-
-
-def test_validate_path_invalid(editor):
-    editor, test_file = editor
-    invalid_file = test_file.parent / 'nonexistent.txt'
-    with pytest.raises(EditorToolParameterInvalidError):
-        editor(command='view', path=str(invalid_file))
-
-
-def test_create_existing_file_error(editor):
-    editor, test_file = editor
-    with pytest.raises(EditorToolParameterInvalidError):
-        editor(command='create', path=str(test_file), file_text='New content')
-
-
-def test_str_replace_missing_old_str(editor):
-    editor, test_file = editor
-    with pytest.raises(EditorToolParameterMissingError):
-        editor(command='str_replace', path=str(test_file), new_str='sample')
+    assert test_file.read_bytes() == TEST_FILE_CONTENT  # Original content restored
 
 
-def test_str_replace_new_str_and_old_str_same(editor):
+def test_undo_edit_history_is_bounded(editor):
     editor, test_file = editor
-    with pytest.raises(EditorToolParameterInvalidError) as exc_info:
+    for i in range(MAX_FILE_HISTORY_LENGTH + 1):
         editor(
             command='str_replace',
             path=str(test_file),
-            old_str='test file',
-            new_str='test file',
+            old_str=f'file{"!" * i}.',
+            new_str=f'file{"!" * (i + 1)}.',
         )
-    assert (
-        'No replacement was performed. `new_str` and `old_str` must be different.'
-        in str(exc_info.value.message)
-    )
-
-
-def test_insert_missing_line_param(editor):
-    editor, test_file = editor
-    with pytest.raises(EditorToolParameterMissingError):
-        editor(command='insert', path=str(test_file), new_str='Missing insert line')
-
-
-def test_undo_edit_no_history_error(editor):
-    editor, test_file = editor
-    empty_file = test_file.parent / 'empty.txt'
-    empty_file.write_text('')
+    for _ in range(MAX_FILE_HISTORY_LENGTH):
+        editor(command='undo_edit', path=str(test_file))
+    # The oldest version has been dropped from the history
+    assert test_file.read_bytes() == TEST_FILE_CONTENT.replace(b'file.', b'file!.')
     with pytest.raises(ToolError):
-        editor(command='undo_edit', path=str(empty_file))
+        editor(command='undo_edit', path=str(test_file))
+
+
+@pytest.mark.parametrize(
+    'path_name,kwargs,exc,msg_frag',
+    [
+        pytest.param(
+            'nonexistent.txt',
+            dict(command='view'),
+            EditorToolParameterInvalidError,
+            'does not exist',
+            id='validate_path_invalid',
+        ),
+        pytest.param(
+            None,
+            dict(command='create', file_text='New content'),
+            EditorToolParameterInvalidError,
+            'Cannot overwrite files',
+            id='create_existing_file_error',
+        ),
+        pytest.param(
+            None,
+            dict(command='str_replace', new_str='sample'),
+            EditorToolParameterMissingError,
+            'Parameter `old_str` is required',
+            id='str_replace_missing_old_str',
+        ),
+        pytest.param(
+            None,
+            dict(command='str_replace', old_str='test file', new_str='test file'),
+            EditorToolParameterInvalidError,
+            'No replacement was performed. `new_str` and `old_str` must be different.',
+            id='str_replace_new_str_and_old_str_same',
+        ),
+        pytest.param(
+            None,
+            dict(command='insert', new_str='Missing insert line'),
+            EditorToolParameterMissingError,
+            'Parameter `insert_line` is required',
+            id='insert_missing_line_param',
+        ),
+        pytest.param(
+            None,
+            dict(command='undo_edit'),
+            ToolError,
+            'No edit history found',
+            id='undo_edit_no_history_error',
+        ),
+    ],
+)
+def test_invalid_command_errors(editor, path_name, kwargs, exc, msg_frag):
+    editor, test_file = editor
+    # None stands for the fixture's test file, otherwise a sibling of it
+    path = test_file if path_name is None else test_file.parent / path_name
+    with pytest.raises(exc) as exc_info:
+        editor(path=str(path), **kwargs)
+    assert msg_frag in str(exc_info.value.message)
@@ -111,3 +111,16 @@ def test_parenthesis_incorrect_ruby_file(parenthesis_incorrect_ruby_file):
     general_linter = DefaultLinter()
     general_result = general_linter.lint(parenthesis_incorrect_ruby_file)
     assert general_result == result
+
+
+def test_parser_reused_across_files(parenthesis_incorrect_ruby_file, tmp_path):
+    correct_ruby_file = tmp_path / 'correct.rb'
+    correct_ruby_file.write_text("def foo\n  puts 'Hello'\nend\n")
+
+    linter = TreesitterBasicLinter()
+    assert linter.lint(str(correct_ruby_file)) == []
+    parser = linter._parsers['ruby']
+
+    result = linter.lint(parenthesis_incorrect_ruby_file)
+    assert len(result) == 1
+    assert linter._parsers['ruby'] is parser